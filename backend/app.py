@@ -1,51 +1,279 @@
 # app.py
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from requests.adapters import HTTPAdapter
+from cachetools import TTLCache
 from dotenv import load_dotenv
 import os
-import traceback
-import json
+import logging
 import re
 import random
+import hashlib
+import threading
+import bisect
+import collections
+import functools
+import numpy as np
+import ahocorasick
+import orjson
 
 load_dotenv()
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# getLevelName maps known level names to their number; anything else (e.g. a typo)
+# would make basicConfig raise and take every worker down at boot
+_log_level_valid = isinstance(logging.getLevelName(LOG_LEVEL), int)
+logging.basicConfig(level=LOG_LEVEL if _log_level_valid else "INFO", format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+if not _log_level_valid:
+    logger.warning("Unknown LOG_LEVEL %r; using INFO", LOG_LEVEL)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by request.get_json() and jsonify()."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), mimetype="application/json")
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 API_KEY = os.getenv("GENAI_API_KEY")
 if not API_KEY:
-    print("WARNING: GENAI_API_KEY not set in environment. Set it in your .env for real requests.")
-genai.configure(api_key=API_KEY)
+    logger.warning("GENAI_API_KEY not set in environment. Set it in your .env for real requests.")
+# REST goes through requests/urllib3, which gevent can patch; the default gRPC transport would block
+genai.configure(api_key=API_KEY, transport="rest")
+
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "32"))
+
+def configure_gemini_http_pool(pool_size):
+    """
+    Mount a larger keep-alive connection pool on the session behind the shared Gemini
+    client, so concurrent requests reuse TLS connections instead of reconnecting once
+    more than requests' default 10 are in flight.
+    """
+    try:
+        session = getattr(genai_client.get_default_generative_client().transport, "_session", None)
+    except Exception:
+        logger.warning("Could not create Gemini client; using default HTTP pool", exc_info=True)
+        return
+    if session is None:
+        return
+    session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0))
+
+if API_KEY:
+    configure_gemini_http_pool(GEMINI_POOL_SIZE)
 
 # create model handle (keep your configured model)
 model = genai.GenerativeModel("gemini-2.0-flash")
 
-# Load intents.json at startup
-INTENTS_PATH = os.path.join(os.path.dirname(__file__), "intents.json")
-try:
-    with open(INTENTS_PATH, "r", encoding="utf-8") as f:
-        intents_data = json.load(f)
-        intents = intents_data.get("intents", intents_data) if isinstance(intents_data, dict) else intents_data
-except Exception as e:
-    print(f"Could not load intents.json from {INTENTS_PATH}: {e}")
-    intents = []
+def warmup_gemini():
+    """
+    Make one cheap count_tokens call so the client, auth headers and a pooled TLS
+    connection are ready before the first chat request. Run once per worker process.
+    """
+    if not API_KEY:
+        return
+    try:
+        model.count_tokens("warmup", request_options={"timeout": 10})
+    except Exception:
+        logger.warning("Gemini warmup failed", exc_info=True)
+
+# Gemini replies keyed by a hash of the conversation (see response_cache_key)
+RESPONSE_CACHE = TTLCache(maxsize=2048, ttl=3600)
+_response_cache_lock = threading.Lock()
+
+# Semantic cache: answers paraphrases of earlier single-turn prompts. Every miss costs
+# one embedding call, so it is opt-in via SEMANTIC_CACHE=1.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+class SemanticCache:
+    """
+    Fixed-size ring buffer of unit-normalized prompt embeddings and their replies.
+    Each entry carries an integer context id and only matches lookups with the same
+    one. A lookup is one matrix-vector product over the stored vectors; once full,
+    the oldest entry is overwritten.
+    """
+
+    def __init__(self, maxsize=4096, threshold=0.92):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._vecs = None  # allocated on first add, once the embedding size is known
+        self._replies = [None] * maxsize
+        self._contexts = np.zeros(maxsize, dtype=np.int64)
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, context, vec):
+        """Return the cached reply in context whose prompt is most similar to vec, or None."""
+        with self._lock:
+            if not self._size:
+                return None
+            sims = self._vecs[:self._size] @ vec
+            sims[self._contexts[:self._size] != context] = -1.0
+            i = int(sims.argmax())
+            return self._replies[i] if sims[i] >= self.threshold else None
+
+    def add(self, context, vec, reply):
+        with self._lock:
+            if self._vecs is None:
+                self._vecs = np.zeros((self.maxsize, vec.shape[0]), dtype=np.float32)
+            self._vecs[self._next] = vec
+            self._replies[self._next] = reply
+            self._contexts[self._next] = context
+            self._next = (self._next + 1) % self.maxsize
+            self._size = min(self._size + 1, self.maxsize)
+
+SEMANTIC_CACHE = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD)
+
+def semantic_cache_key(normalized):
+    """
+    (context_id, embedding) for a single-turn prompt, or None. Only the last text part,
+    the user's own words, is embedded. Earlier parts (the client's instruction and
+    user memory) are hashed into context_id instead: a long shared preamble would pull
+    unrelated questions above the similarity cutoff, and replies must not be shared
+    between different preambles.
+    """
+    parts = normalized[0]["parts"]
+    question = str(parts[-1]["text"]).strip()
+    if not question:
+        return None
+    vec = embed_text(question)
+    if vec is None:
+        return None
+    context = orjson.dumps([p["text"] for p in parts[:-1]])
+    context_id = int.from_bytes(hashlib.blake2b(context, digest_size=8).digest(), "little", signed=True)
+    return context_id, vec
+
+def embed_text(text):
+    """Unit-normalized float32 embedding of text, or None if the embedding call fails."""
+    try:
+        result = genai.embed_content(model=EMBEDDING_MODEL, content=text, task_type="semantic_similarity")
+        vec = np.asarray(result["embedding"], dtype=np.float32)
+    except Exception:
+        logger.exception("Embedding request failed")
+        return None
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else None
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_WS_RE = re.compile(r"\s+")
+# ASCII characters that _PUNCT_RE would replace, mapped to spaces for str.translate
+_ASCII_PUNCT_TO_SPACE = str.maketrans({c: " " for c in map(chr, range(128)) if _PUNCT_RE.match(c)})
 
 def normalize_text(s: str) -> str:
     """Lowercase, remove punctuation, collapse whitespace for robust matching."""
     if not isinstance(s, str):
         return ""
     s = s.lower()
+    if s.isascii():
+        # fast path: one translate pass, then split/join collapses whitespace
+        return " ".join(s.translate(_ASCII_PUNCT_TO_SPACE).split())
     # replace any non-word characters with space (keeps letters/numbers/underscore)
-    s = re.sub(r"[^\w\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    return _WS_RE.sub(" ", _PUNCT_RE.sub(" ", s)).strip()
+
+# Intents are frozen at startup; patterns_norm holds the normalized patterns used for matching
+Intent = collections.namedtuple("Intent", "tag patterns_norm responses")
+
+def load_intents(path):
+    """Parse intents.json (a list, or a dict with an "intents" list) into a tuple of Intents."""
+    with open(path, "rb") as f:
+        intents_data = orjson.loads(f.read())
+    raw = intents_data.get("intents", intents_data) if isinstance(intents_data, dict) else intents_data
+    return tuple(
+        Intent(
+            it.get("tag", ""),
+            tuple(normalize_text(p) for p in it.get("patterns", []) if isinstance(p, str)),
+            tuple(it.get("responses", [])),
+        )
+        for it in raw
+        if isinstance(it, dict)
+    )
+
+# Load intents.json at startup
+INTENTS_PATH = os.path.join(os.path.dirname(__file__), "intents.json")
+try:
+    intents = load_intents(INTENTS_PATH)
+except Exception as e:
+    logger.error("Could not load intents.json from %s: %s", INTENTS_PATH, e)
+    intents = ()
 
-# Precompute normalized patterns for matching
-for intent in intents:
-    patterns = intent.get("patterns", [])
-    intent["_patterns_norm"] = [normalize_text(p) for p in patterns if isinstance(p, str)]
+def build_pattern_automaton(intents):
+    """
+    Aho-Corasick automaton over every normalized pattern, so one pass over the user
+    text finds all pattern occurrences. Values are (intent_index, pattern_index, length);
+    when the same pattern appears twice, the earlier intent keeps it. Returns None when
+    there are no patterns (e.g. intents.json failed to load), since an empty automaton
+    cannot be built or searched.
+    """
+    automaton = ahocorasick.Automaton()
+    for i, intent in enumerate(intents):
+        # Catch-all fallback intents never match, so the request goes to the AI instead
+        if intent.tag == "unrecognized_input":
+            continue
+        for idx, patt_norm in enumerate(intent.patterns_norm):
+            if patt_norm and patt_norm not in automaton:
+                automaton.add_word(patt_norm, (i, idx, len(patt_norm)))
+    if not len(automaton):
+        return None
+    automaton.make_automaton()
+    return automaton
+
+def build_pattern_corpus(intents):
+    """
+    All normalized patterns joined by newlines in intent/pattern order, plus the start
+    offset and (intent_index, pattern_index) of each. Normalized text never contains a
+    newline, so a single str.find over the corpus returns the first pattern containing it.
+    """
+    chunks, offsets, entries = [], [], []
+    pos = 0
+    for i, intent in enumerate(intents):
+        if intent.tag == "unrecognized_input":
+            continue
+        for idx, patt_norm in enumerate(intent.patterns_norm):
+            if patt_norm:
+                chunks.append(patt_norm)
+                offsets.append(pos)
+                entries.append((i, idx))
+                pos += len(patt_norm) + 1
+    return "\n".join(chunks), offsets, entries
+
+def build_exact_pattern_index(intents):
+    """
+    Map each single-word normalized pattern to (intent_index, pattern_index), first
+    writer wins. A one-word message can only match an identical pattern, so this dict
+    gives the same answer as the automaton for inputs like "hi" or "thanks".
+    """
+    index = {}
+    for i, intent in enumerate(intents):
+        if intent.tag == "unrecognized_input":
+            continue
+        for idx, patt_norm in enumerate(intent.patterns_norm):
+            if patt_norm and " " not in patt_norm:
+                index.setdefault(patt_norm, (i, idx))
+    return index
+
+EXACT_PATTERN_INDEX = build_exact_pattern_index(intents)
+PATTERN_AUTOMATON = build_pattern_automaton(intents)
+PATTERN_CORPUS, PATTERN_OFFSETS, PATTERN_ENTRIES = build_pattern_corpus(intents)
+
+# Gemini role for each client-side sender name; anything else is sent as "user"
+_SENDER_TO_ROLE = {"user": "user", "bot": "model", "model": "model", "assistant": "model"}
 
 def extract_user_text_from_request(data):
     # (same robust extraction as before)
@@ -78,40 +306,139 @@ def extract_user_text_from_request(data):
 
     return ""
 
+def response_cache_key(normalized):
+    """
+    Stable cache key for a conversation: blake2b digest of the text of a single
+    text-only user turn, case-folded and whitespace-collapsed, otherwise of the
+    conversation's canonical JSON, so history and attachments are part of the key.
+    Punctuation is kept on purpose ("what is c++" and "what is c" differ), so this
+    must not go through normalize_text.
+    """
+    if is_single_turn(normalized):
+        payload = b"t:" + " ".join(single_turn_text(normalized).casefold().split()).encode("utf-8")
+    else:
+        payload = b"j:" + orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def single_turn_text(normalized):
+    """All text parts of a single-turn conversation, joined."""
+    return "\n".join(str(p["text"]) for p in normalized[0]["parts"])
+
+def is_single_turn(normalized):
+    """
+    True when the conversation is one text-only user turn, i.e. the reply depends only
+    on that text and not on earlier history or attached files.
+    """
+    if len(normalized) != 1 or normalized[0].get("role") != "user":
+        return False
+    parts = normalized[0].get("parts")
+    if not isinstance(parts, list):
+        return False
+    return all(isinstance(p, dict) and set(p) == {"text"} for p in parts)
+
+def find_pattern_hit(text_norm):
+    """
+    (intent_index, pattern_index) of the earliest pattern occurring in text_norm as
+    whole words, or None. Normalized text is words separated by single spaces, so an
+    automaton hit is whole-word when bounded by spaces or the ends of the string.
+    """
+    if PATTERN_AUTOMATON is None:
+        return None
+    best = None
+    last = len(text_norm) - 1
+    for end, (i, idx, length) in PATTERN_AUTOMATON.iter(text_norm):
+        start = end - length + 1
+        if (start == 0 or text_norm[start - 1] == " ") and (end == last or text_norm[end + 1] == " "):
+            if best is None or (i, idx) < best:
+                best = (i, idx)
+    return best
+
+def extract_reply_text(response):
+    """
+    Text of a Gemini GenerateContentResponse, or None if it has none. response.text
+    raises ValueError when the candidate has no parts (e.g. blocked by safety filters).
+    """
+    try:
+        return response.text
+    except (AttributeError, ValueError):
+        pass
+    try:
+        return response.candidates[0].content.parts[0].text
+    except (AttributeError, IndexError):
+        return None
+
 def match_intent(user_text):
     """
     Return (matched_intent_obj, matched_pattern_index) or (None, None)
     We try:
-      1) exact normalized equality
-      2) normalized pattern in normalized text (substring)
-      3) normalized text in normalized pattern
+      1) normalized patterns occurring in the normalized text as whole words,
+         preferring the earliest intent (and earliest pattern within it)
+      2) normalized text in normalized pattern, only if nothing matched above
     """
     if not user_text:
         return None, None
     text_norm = normalize_text(user_text)
+    if not text_norm:
+        return None, None
 
-    for intent in intents:
-        tag = intent.get("tag", "")
-        # Optional: skip catch-all fallback intents if you want AI fallback
-        if tag == "unrecognized_input":
-            continue
+    i, idx = match_normalized_text(text_norm)
+    if i is None:
+        return None, None
+    return intents[i], idx
+
+@functools.lru_cache(maxsize=512)
+def match_normalized_text(text_norm):
+    """
+    (intent_index, pattern_index) for a normalized message, or (None, None).
+    Misses are cached too, so repeated small talk that falls through to the AI
+    doesn't rescan the patterns. Intents are fixed after startup, so entries never go stale.
+    """
+    hit = EXACT_PATTERN_INDEX.get(text_norm)
+    if hit is not None:
+        return hit
+
+    # 1) one automaton pass over the text
+    best = find_pattern_hit(text_norm)
+    if best is not None:
+        return best
 
-        patterns_norm = intent.get("_patterns_norm", [])
-        for idx, patt_norm in enumerate(patterns_norm):
-            if not patt_norm:
-                continue
-            # 1) exact normalized match
-            if patt_norm == text_norm:
-                return intent, idx
-            # 2) substring matches (pattern in user text)
-            if patt_norm in text_norm:
-                return intent, idx
-            # 3) user text contained in pattern (rare but useful)
-            if text_norm in patt_norm:
-                return intent, idx
+    # 2) user text contained in pattern (rare but useful)
+    pos = PATTERN_CORPUS.find(text_norm)
+    if pos != -1:
+        return PATTERN_ENTRIES[bisect.bisect_right(PATTERN_OFFSETS, pos) - 1]
 
     return None, None
 
+def remember_reply(ckey, skey, reply_text):
+    """Store a Gemini reply in the exact cache, and in the semantic cache if the prompt was embedded."""
+    with _response_cache_lock:
+        RESPONSE_CACHE[ckey] = reply_text
+    if skey is not None:
+        SEMANTIC_CACHE.add(*skey, reply_text)
+
+def stream_reply(stream, ckey, skey=None):
+    """
+    Yield a streamed Gemini response as NDJSON: one {"delta": text} line per chunk,
+    then {"done": true, "source": "ai"}, or {"error": ...} if the stream breaks.
+    The full reply is cached once the stream completes.
+    """
+    chunks = []
+    try:
+        for chunk in stream:
+            text = extract_reply_text(chunk)
+            if text:
+                chunks.append(text)
+                yield orjson.dumps({"delta": text}) + b"\n"
+    except Exception as e:
+        logger.exception("Error streaming from Gemini API")
+        yield orjson.dumps({"error": f"Error calling Gemini API: {str(e)}"}) + b"\n"
+        return
+
+    reply_text = "".join(chunks)
+    if reply_text:
+        remember_reply(ckey, skey, reply_text)
+    yield orjson.dumps({"done": True, "source": "ai"}) + b"\n"
+
 @app.route("/")
 def home():
     return "Flask backend is running! Use /chat or /api/chat to chat."
@@ -127,18 +454,23 @@ def chat():
     except Exception:
         return jsonify({"error": "Invalid JSON"}), 400
 
+    if not isinstance(data, dict):
+        data = {}
+
+    # Reject empty bodies before doing any work. This checks for input rather than
+    # extracted text: a turn carrying only an attached file has no text to extract.
     messages = data.get("messages")
     contents = data.get("contents")
     if not messages and not contents and not data.get("text"):
         return jsonify({"error": "No messages/contents provided or invalid format"}), 400
 
     user_text = extract_user_text_from_request(data)
-    print("User text extracted:", user_text)
+    logger.debug("User text extracted: %s", user_text)
 
     # Try local intents first
     intent_obj, patt_idx = match_intent(user_text)
     if intent_obj:
-        responses = intent_obj.get("responses", [])
+        responses = intent_obj.responses
         reply_text = None
         # Prefer a response at the same index as the matched pattern
         if patt_idx is not None and isinstance(patt_idx, int) and patt_idx < len(responses):
@@ -151,18 +483,16 @@ def chat():
             reply_text = random.choice(responses)
 
         if reply_text:
-            return jsonify({"reply": reply_text, "source": "intents", "intent": intent_obj.get("tag")}), 200
+            return jsonify({"reply": reply_text, "source": "intents", "intent": intent_obj.tag}), 200
 
     # No local intent match -> send to AI (Gemini)
     # Normalize into the expected structure
     normalized = []
     if messages and isinstance(messages, list):
-        for m in messages:
-            role = m.get("sender", "").lower()
-            if role not in ("user", "bot", "model", "assistant"):
-                role = "model" if role == "bot" else "user"
-            text = m.get("text", "")
-            normalized.append({"role": "user" if role == "user" else "model", "parts": [{"text": text}]})
+        normalized = [
+            {"role": _SENDER_TO_ROLE.get((m.get("sender") or "").lower(), "user"), "parts": [{"text": m.get("text", "")}]}
+            for m in messages
+        ]
     elif contents and isinstance(contents, list):
         for c in contents:
             if isinstance(c, dict) and "role" in c and "parts" in c:
@@ -174,50 +504,50 @@ def chat():
     else:
         normalized.append({"role": "user", "parts": [{"text": user_text}]})
 
-    print("Normalized request to send to Gemini:", normalized)
+    logger.debug("Normalized request to send to Gemini: %s", normalized)
+
+    # Repeated conversations are answered from the cache without calling Gemini
+    ckey = response_cache_key(normalized)
+    with _response_cache_lock:
+        cached = RESPONSE_CACHE.get(ckey)
+    if cached:
+        return jsonify({"reply": cached, "source": "cache"}), 200
+
+    # Paraphrases of earlier single-turn prompts are matched by embedding similarity
+    skey = None
+    if SEMANTIC_CACHE_ENABLED and is_single_turn(normalized):
+        skey = semantic_cache_key(normalized)
+        if skey is not None:
+            cached = SEMANTIC_CACHE.lookup(*skey)
+            if cached:
+                return jsonify({"reply": cached, "source": "semantic_cache"}), 200
 
     try:
+        if data.get("stream"):
+            # The SDK fetches the first chunk before returning, so connection and
+            # API errors still surface here as a 500 rather than mid-stream
+            stream = model.generate_content(normalized, stream=True)
+            return app.response_class(stream_reply(stream, ckey, skey), mimetype="application/x-ndjson")
+
         response = model.generate_content(normalized)
 
-        reply_text = None
-        if hasattr(response, "text") and getattr(response, "text"):
-            reply_text = getattr(response, "text")
-        elif isinstance(response, dict):
-            if response.get("reply"):
-                reply_text = response.get("reply")
-            elif response.get("text"):
-                reply_text = response.get("text")
-            elif response.get("candidates"):
-                try:
-                    reply_text = response["candidates"][0]["content"]["parts"][0]["text"]
-                except Exception:
-                    reply_text = None
-        else:
-            candidates = getattr(response, "candidates", None)
-            if candidates:
-                try:
-                    cand0 = candidates[0]
-                    content = cand0.get("content") if isinstance(cand0, dict) else getattr(cand0, "content", None)
-                    if content:
-                        parts = content.get("parts") if isinstance(content, dict) else getattr(content, "parts", None)
-                        if parts and len(parts) > 0:
-                            part0 = parts[0]
-                            reply_text = part0.get("text") if isinstance(part0, dict) else getattr(part0, "text", None)
-                except Exception:
-                    reply_text = None
+        reply_text = extract_reply_text(response)
+
+        if reply_text:
+            remember_reply(ckey, skey, reply_text)
 
         if not reply_text:
-            try:
-                reply_text = str(response)
-            except Exception:
-                reply_text = "No textual reply found in model response."
+            reply_text = str(response)
 
         return jsonify({"reply": reply_text, "source": "ai"}), 200
 
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Error calling Gemini API")
         return jsonify({"error": f"Error calling Gemini API: {str(e)}"}), 500
 
 if __name__ == "__main__":
+    warmup_gemini()
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    # Debug mode (reloader + debugger) is opt-in; it must never be on in a deployed server
+    debug = os.environ.get("FLASK_DEBUG", "0").lower() in ("1", "true", "yes")
+    app.run(host="0.0.0.0", port=port, debug=debug)
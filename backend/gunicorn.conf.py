@@ -0,0 +1,19 @@
+# gunicorn.conf.py
+# Picked up automatically when running `gunicorn app:app` from the backend folder.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Chat requests spend nearly all their time waiting on Gemini, so each worker runs
+# gevent greenlets that yield during the HTTP call instead of blocking the process.
+worker_class = "gevent"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_connections = 1000
+
+
+def post_worker_init(worker):
+    # Runs in each worker after gevent has patched sockets, so the warmed-up
+    # connection is one the worker's greenlets can use
+    from app import warmup_gemini
+    warmup_gemini()
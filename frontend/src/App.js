@@ -201,6 +201,35 @@ function App() {
     if (chatBox) chatBox.scrollTop = 0;
   };
 
+  // Reads a streamed reply (NDJSON: {"delta"} lines, then {"done"} or {"error"}),
+  // showing the text as it arrives. Resolves with the full reply text.
+  const readStreamedReply = useCallback(async (response) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    let replyText = "";
+    setBotTypingText("");
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split("\n");
+      buffered = lines.pop();
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.error) {
+          throw new Error(`API Error: ${event.error}`);
+        }
+        if (event.delta) {
+          replyText += event.delta;
+          setBotTypingText(replyText);
+        }
+      }
+    }
+    return replyText;
+  }, []);
+
   // API base (points to your Flask backend). Set REACT_APP_API_BASE_URL in .env if needed.
   const API_BASE = process.env.REACT_APP_API_BASE_URL || "https://chatbot-1-v6e3.onrender.com";
 
@@ -307,7 +336,7 @@ function App() {
               if (!firstMessageProcessed) {
                   chatHistoryForAPI.push({
                       role: "user",
-                      parts: [{ text: `${systemInstruction}\n${msg.text}` }]
+                      parts: [{ text: systemInstruction }, { text: msg.text }]
                   });
                   firstMessageProcessed = true;
               } else {
@@ -325,11 +354,10 @@ function App() {
       });
 
       if (!firstMessageProcessed) {
-          const firstUserMessageParts = [];
+          // The instruction goes in its own part so the backend can tell it apart from the user's words
+          const firstUserMessageParts = [{ text: systemInstruction }];
           if (messageToSend) {
-              firstUserMessageParts.push({ text: `${systemInstruction}\n${messageToSend}` });
-          } else {
-              firstUserMessageParts.push({ text: systemInstruction });
+              firstUserMessageParts.push({ text: messageToSend });
           }
 
           if (selectedFile) {
@@ -354,6 +382,7 @@ function App() {
 
       const payload = {
         contents: chatHistoryForAPI,
+        stream: true,
         generationConfig: {
             temperature: 0.7,
             topK: 40,
@@ -374,15 +403,24 @@ function App() {
         throw new Error(`API Error: ${response.status} - ${errorData.message || response.statusText}`);
       }
 
-      const result = await response.json();
+      // AI replies are streamed; intent and cached replies still come back as plain JSON
+      if ((response.headers.get("content-type") || "").includes("application/x-ndjson")) {
+        const replyText = await readStreamedReply(response);
+        if (!signal.aborted && !botReplyAddedRef.current) {
+          setChatLog((prev) => [...prev, { sender: "bot", text: replyText || "Sorry, I couldn't get a response from Chatbot.", timestamp: new Date() }]);
+          botReplyAddedRef.current = true;
+        }
+      } else {
+        const result = await response.json();
 
-      // Try multiple possible response shapes coming from backend
-      const replyText = result.reply || result.text || (result.candidates && result.candidates[0]?.content?.parts?.[0]?.text) || result.message || result.answer || "Sorry, I couldn't get a response from Chatbot.";
+        // Try multiple possible response shapes coming from backend
+        const replyText = result.reply || result.text || (result.candidates && result.candidates[0]?.content?.parts?.[0]?.text) || result.message || result.answer || "Sorry, I couldn't get a response from Chatbot.";
 
-      if (!signal.aborted) {
-        await typeEffect(replyText);
-      } else {
-        setBotTypingText("");
+        if (!signal.aborted) {
+          await typeEffect(replyText);
+        } else {
+          setBotTypingText("");
+        }
       }
 
       const nameMatch = messageToSend.match(/(?:my name is|I'm)\s+([A-Z][a-z]+)/i);
@@ -409,7 +447,7 @@ function App() {
       typingIntervalRef.current = null;
       botReplyAddedRef.current = false;
     }
-  }, [message, loading, chatLog, typeEffect, selectedFile, botTypingText, userMemory, creatorName]);
+  }, [message, loading, chatLog, typeEffect, readStreamedReply, selectedFile, botTypingText, userMemory, creatorName]);
 
   return (
     <div